@@ -0,0 +1,127 @@
+# --- 点位人群画像验证：回归测试（基于本地高德桩服务，不访问网络） ---
+"""锁定性能改动承诺的不变量：串行/并发/逐地址路径的汇总行一致、多半径与单半径一致、离线重算与在线逐位一致、
+向量化打分与逐地址打分一致，以及令牌桶、响应缓存 TTL/LRU 淘汰与批量输出顺序。
+
+    python -m pytest -q test_点位人群画像验证.py"""
+
+import csv
+import glob
+import os
+import random
+
+import pytest
+
+import 点位人群画像验证 as site
+from 点位人群画像基准测试 import AmapStub
+
+ADDRESSES = ["bench-cbd-0", "bench-suburb-0", "bench-urban-0", "bench-town-0"]
+RADIUS = 800
+
+@pytest.fixture(scope="module")
+def stub():
+    with AmapStub() as stub: yield stub
+
+def quiet(message): pass
+
+def run_batch(stub, addresses, radius, workdir, **kwargs):
+    """在 workdir 下运行 evaluate_many，返回按输入顺序排列的结果与汇总表行"""
+    os.makedirs(workdir, exist_ok=True)
+    cwd = os.getcwd(); os.chdir(workdir) # 汇总表写在当前目录
+    try:
+        results = {i: result for i, _, result in site.evaluate_many(addresses, radius, backup_dir="backup", logger_func=quiet, rate_limiter=site.RateLimiter(1000),
+                                                                    base_url=stub.base_url, report_dir=None, timestamp="test", **kwargs)}
+        return [results[i] for i in range(len(addresses))], read_summary(workdir)
+    finally: os.chdir(cwd)
+
+def read_summary(workdir) -> list:
+    rows = []
+    for path in sorted(glob.glob(os.path.join(workdir, "analysis_summary_*.csv"))):
+        with open(path, newline='', encoding='utf-8-sig') as f: rows += list(csv.DictReader(f))
+    for row in rows: row.pop('分析时间')
+    return rows
+
+def comparable(result: site.LocationResult) -> dict:
+    row = site.asdict(result); row.pop('analyzed_at'); return row
+
+def test_serial_concurrent_and_single_address_paths_match(stub, tmp_path):
+    _, serial = run_batch(stub, ADDRESSES, RADIUS, tmp_path / "serial", workers=1, fetch_workers=1)
+    _, concurrent = run_batch(stub, ADDRESSES, RADIUS, tmp_path / "concurrent", workers=3, fetch_workers=6)
+    # 原有的逐地址路径：AnalysisCore 自己追加汇总表
+    os.makedirs(tmp_path / "legacy"); cwd = os.getcwd(); os.chdir(tmp_path / "legacy")
+    try:
+        core = site.AnalysisCore(quiet, base_url=stub.base_url)
+        for address in ADDRESSES: core.evaluate_location(address, RADIUS)
+    finally: os.chdir(cwd); core.transport.close()
+    legacy = read_summary(tmp_path / "legacy")
+    assert len(serial) == len(ADDRESSES)
+    assert serial == concurrent == legacy
+
+def test_multi_radius_matches_single_radius_runs(stub, tmp_path):
+    radii = [300, 800, 1500]
+    multi, _ = run_batch(stub, ADDRESSES, radii, tmp_path / "multi", workers=2, fetch_workers=4)
+    for k, radius in enumerate(radii):
+        single, _ = run_batch(stub, ADDRESSES, radius, tmp_path / f"single_{radius}", workers=2, fetch_workers=4)
+        assert [comparable(results[k]) for results in multi] == [comparable(result) for result in single]
+
+def test_replay_matches_online_bit_for_bit(stub, tmp_path):
+    online, _ = run_batch(stub, ["bench-cbd-0", "bench-urban-1"], 1500, tmp_path, workers=2, fetch_workers=6)
+    for path in glob.glob(str(tmp_path / "backup" / "*.csv")):
+        # 打乱周边搜索各页的顺序（地理编码行仍在最前），模拟并发查询时备份行乱序
+        with open(path, newline='', encoding='utf-8-sig') as f: rows = list(csv.DictReader(f))
+        rows = rows[:1] + random.Random(0).sample(rows[1:], len(rows) - 1)
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.DictWriter(f, fieldnames=site.BACKUP_FIELDNAMES); writer.writeheader(); writer.writerows(rows)
+    replayed = {results[0].address: results[0] for _, results in site.replay_backups(str(tmp_path / "backup"))}
+    assert {result.address: comparable(result) for result in online} == {address: comparable(result) for address, result in replayed.items()}
+
+def test_scoring_kernel_matches_evaluate_location(stub, tmp_path):
+    results, _ = run_batch(stub, ADDRESSES, RADIUS, tmp_path, workers=2, fetch_workers=4)
+    model = site.build_model_matrices()
+    counts = [[result.counts[name] for name in model['names']] for result in results]
+    scored = site.score_matrix(counts, model, bonus=[result.quality_bonus + result.profile_bonus for result in results])
+    assert scored['totals'][:, 0] == pytest.approx([result.total_score for result in results])
+    assert list(scored['grades'][:, 0]) == [result.grade for result in results]
+
+def test_batch_summary_follows_input_order(stub, tmp_path):
+    # 密集点位请求多、完成晚，后面的稀疏点位先完成
+    addresses = ["bench-cbd-1", "bench-suburb-1", "bench-suburb-2", "bench-cbd-2", "bench-suburb-3"]
+    results, summary = run_batch(stub, addresses, RADIUS, tmp_path, workers=4, fetch_workers=2)
+    assert [result.address for result in results] == addresses
+    assert [row['地址'] for row in summary] == addresses
+
+def test_rate_limiter_allows_burst_then_spaces_requests():
+    limiter = site.RateLimiter(rate=10, capacity=2)
+    waits = [limiter.reserve() for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2:] == pytest.approx([0.1, 0.2], abs=0.02)
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0): self.now = now
+    def __call__(self): self.now += 0.001; return self.now # 每次调用前进 1 毫秒，访问时间不会相同
+
+def test_response_cache_expires_entries_after_ttl(tmp_path, monkeypatch):
+    clock = FakeClock(); monkeypatch.setattr(site.time, "time", clock)
+    cache = site.ResponseCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    key = cache.make_key("geocode", {'key': "k", 'address': "a"})
+    cache.put(key, {'status': '1'})
+    assert cache.get(key) == {'status': '1'}
+    clock.now += 61
+    assert cache.get(key) is None
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'entries': 0}
+    cache.put(key, {'status': '1'}); cache.close()
+    clock.now += 61 # 重新打开时清理过期条目
+    cache = site.ResponseCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    assert cache.stats()['entries'] == 0
+    cache.close()
+
+def test_response_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(site.time, "time", FakeClock())
+    cache = site.ResponseCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    keys = [cache.make_key("around_search", {'location': "104.0,30.0", 'page_num': n}) for n in range(3)]
+    cache.put(keys[0], {'n': 0}); cache.put(keys[1], {'n': 1})
+    cache.get(keys[0]) # keys[1] 成为最久未访问的条目
+    cache.put(keys[2], {'n': 2})
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == {'n': 0} and cache.get(keys[2]) == {'n': 2}
+    assert cache.stats()['entries'] == 2
+    cache.close()
@@ -0,0 +1,318 @@
+# --- 点位人群画像验证：本地高德桩服务与性能基准 ---
+"""在本地桩服务上复现高德接口（/v3/geocode/geo 与 /v5/place/around），不消耗API配额、不受公网抖动影响，
+用于对比每次性能改动前后的吞吐、延迟与内存。
+
+    python 点位人群画像基准测试.py                                  # 默认场景
+    python 点位人群画像基准测试.py -n 24 --latency 0.05 --error-rate 0.02 -o baseline.json
+    python 点位人群画像基准测试.py --compare baseline.json           # 与基线对比
+
+桩服务按地址名中的密度档位（如 bench-cbd-3）生成确定性的合成POI：同一种子、同一参数下每次运行的数据完全一致。
+桩服务运行在独立进程中，其CPU与内存不计入被测进程的吞吐和峰值内存。"""
+
+import sys
+import argparse
+import logging
+import threading
+import random
+import json
+import time
+import os
+import math
+import hashlib
+import tempfile
+import tracemalloc
+import multiprocessing
+import requests
+import numpy as np
+from functools import lru_cache
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import 点位人群画像验证 as site
+
+logger = logging.getLogger("site_analyzer.bench")
+
+# --- 【基准配置】 ---
+# 密度档位：每平方公里POI数的倍率，从稀疏郊区到密集CBD
+DENSITY_PROFILES = {"suburb": 0.1, "town": 0.35, "urban": 1.0, "cbd": 3.0}
+PROFILE_CENTERS = {"suburb": (103.85, 30.40), "town": (104.20, 30.45), "urban": (104.06, 30.66), "cbd": (104.08, 30.63)}
+ADDRESS_SPACING_DEG = 0.05 # 同档位相邻地址的间隔（约5公里），各地址的合成POI互不重叠
+BASE_DENSITY_RANGE = (2, 40) # 各类别在 urban 档位下的每平方公里POI数（按类别随机、确定性）
+STUB_COUNTERS_PATH = "/_counters" # 桩服务自身的请求/错误计数，带 reset=1 时清零
+STUB_MAX_RADIUS = 3000 # 桩服务生成POI的最大半径(米)，更大半径的查询按此截断
+NOISE_TYPECODE_RATE = 0.1 # 类型码与查询不符的“脏数据”比例，覆盖数据清洗路径
+DEFAULT_RADII = [500, 800, 1500]
+
+# --- 本地高德桩服务 ---
+class AmapStub:
+    """本地高德桩服务：地理编码按地址名确定坐标与密度档位，周边搜索按距离排序分页返回合成POI（v5 接口的 count 为本页条数）。
+    latency/jitter 为每个请求的附加延迟(秒)；http_error_rate 注入HTTP 500，qps_error_rate 注入 10021 QPS超限，均按固定种子抽样。"""
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, http_error_rate: float = 0.0, qps_error_rate: float = 0.0, seed: int = 0, port: int = 0):
+        self.latency, self.jitter = latency, jitter
+        self.http_error_rate, self.qps_error_rate = http_error_rate, qps_error_rate
+        self.seed = seed
+        self.counters = {'geocode': 0, 'around_search': 0, 'http_errors': 0, 'qps_errors': 0}
+        self._profiles = {} # "lon,lat" -> 密度档位，由地理编码登记
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self._server.daemon_threads = True
+        self._server.request_queue_size = 128
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown(); self._server.server_close()
+
+    def __enter__(self):
+        self.start(); return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def get_counters(self, reset: bool = False) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            if reset: self.counters = dict.fromkeys(counters, 0)
+        return counters
+
+    def _count(self, key: str):
+        with self._lock: self.counters[key] += 1
+
+    def _roll_error(self) -> str | None:
+        with self._lock: roll = self._rng.random()
+        if roll < self.http_error_rate: return 'http_errors'
+        if roll < self.http_error_rate + self.qps_error_rate: return 'qps_errors'
+        return None
+
+    def geocode(self, address: str) -> dict:
+        """地址名形如 bench-<档位>-<序号>：坐标为档位中心向东偏移 序号*ADDRESS_SPACING_DEG；其他地址按哈希落在 urban 档位附近"""
+        parts = address.split('-')
+        if len(parts) >= 3 and parts[-2] in DENSITY_PROFILES and parts[-1].isdigit(): profile, index = parts[-2], int(parts[-1])
+        else: profile, index = "urban", int(hashlib.md5(address.encode('utf-8')).hexdigest()[:6], 16) % 100
+        lon, lat = PROFILE_CENTERS[profile]
+        location = f"{lon + index * ADDRESS_SPACING_DEG:.6f},{lat:.6f}"
+        with self._lock: self._profiles[location] = profile
+        return {"status": "1", "info": "OK", "infocode": "10000", "count": "1", "geocodes": [{"formatted_address": address, "location": location}]}
+
+    def place_around(self, query: dict) -> dict:
+        lon, lat = map(float, query['location'].split(','))
+        location = f"{lon:.6f},{lat:.6f}"
+        with self._lock: profile = self._profiles.get(location, "urban")
+        radius = min(int(query.get('radius', 1000)), STUB_MAX_RADIUS)
+        page_size, page_num = int(query.get('page_size', site.PAGE_SIZE)), int(query.get('page_num', 1))
+        pois = self._pois(location, profile, query.get('types', ''), query.get('keywords', ''))
+        within = pois[:sum(1 for poi in pois if int(poi['distance']) <= radius)] # 已按距离排序
+        page = within[(page_num - 1) * page_size: page_num * page_size]
+        return {"status": "1", "info": "OK", "infocode": "10000", "count": str(len(page)), "pois": page}
+
+    @lru_cache(maxsize=512)
+    def _pois(self, location: str, profile: str, types: str, keywords: str) -> list:
+        """在 STUB_MAX_RADIUS 圆内按面积均匀撒点，返回按距离排序的POI；较小半径的查询取其前缀，多半径结果彼此一致"""
+        digest = hashlib.md5(f"{self.seed}|{location}|{types}|{keywords}".encode('utf-8')).hexdigest()
+        rng = random.Random(int(digest[:12], 16))
+        density = rng.uniform(*BASE_DENSITY_RANGE) * DENSITY_PROFILES[profile]
+        count = int(density * math.pi * (STUB_MAX_RADIUS / 1000) ** 2)
+        lon, lat = map(float, location.split(','))
+        typecode = types.split('|')[0] if types else "050000"
+        pois = []
+        for i in range(count):
+            distance, bearing = STUB_MAX_RADIUS * math.sqrt(rng.random()), rng.uniform(0, 2 * math.pi)
+            dlat = math.degrees(distance * math.cos(bearing) / site.EARTH_RADIUS_M)
+            dlon = math.degrees(distance * math.sin(bearing) / (site.EARTH_RADIUS_M * math.cos(math.radians(lat))))
+            pois.append({"id": f"B{digest[:10]}{i:05d}", "name": f"{keywords or types}-{i}",
+                         "typecode": "999999" if rng.random() < NOISE_TYPECODE_RATE else typecode,
+                         "location": f"{lon + dlon:.6f},{lat + dlat:.6f}", "distance": str(int(distance)),
+                         "business": {"rating": f"{rng.uniform(3.0, 5.0):.1f}", "cost": f"{rng.uniform(0, 150):.0f}" if rng.random() < 0.7 else ""}})
+        pois.sort(key=lambda poi: int(poi['distance']))
+        return pois
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # 支持保活，连接池复用才有意义
+
+            def log_message(self, *args): pass
+
+            def _send(self, status: int, body: bytes = b""):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json;charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers(); self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if url.path == STUB_COUNTERS_PATH: return self._send(200, json.dumps(stub.get_counters(reset='reset' in query)).encode('utf-8'))
+                if stub.latency or stub.jitter: time.sleep(stub.latency + random.uniform(0, stub.jitter))
+                if url.path not in (site.GEOCODE_PATH, site.AROUND_SEARCH_PATH): return self._send(404)
+                stub._count('geocode' if url.path == site.GEOCODE_PATH else 'around_search')
+                error = stub._roll_error()
+                if error: stub._count(error)
+                if error == 'http_errors': return self._send(500)
+                if error == 'qps_errors': body = {"status": "0", "info": "CUQPS_HAS_EXCEEDED_THE_LIMIT", "infocode": "10021"}
+                elif url.path == site.GEOCODE_PATH: body = stub.geocode(query.get('address', ''))
+                else: body = stub.place_around(query)
+                self._send(200, json.dumps(body, ensure_ascii=False).encode('utf-8'))
+        return Handler
+
+def _serve_stub(options: dict, ready):
+    stub = AmapStub(**options)
+    ready.put(stub.base_url)
+    stub._server.serve_forever()
+
+class StubProcess:
+    """在独立进程中运行 AmapStub；参数同 AmapStub，计数通过 STUB_COUNTERS_PATH 读取"""
+    def __init__(self, **options):
+        self.options = options
+        self.base_url = None
+        self._process = None
+
+    def __enter__(self):
+        context = multiprocessing.get_context("spawn") # Windows 与 Linux 行为一致
+        ready = context.Queue()
+        self._process = context.Process(target=_serve_stub, args=(self.options, ready), daemon=True)
+        self._process.start()
+        self.base_url = ready.get(timeout=30)
+        return self
+
+    def __exit__(self, *exc):
+        self._process.terminate(); self._process.join()
+
+    def get_counters(self, reset: bool = False) -> dict:
+        return requests.get(self.base_url + STUB_COUNTERS_PATH, params={'reset': 1} if reset else {}, timeout=10).json()
+
+# --- 基准场景 ---
+def make_addresses(count: int, profiles: list = None) -> list:
+    """按档位轮流生成地址：bench-suburb-0, bench-town-0, bench-urban-0, bench-cbd-0, bench-suburb-1, ..."""
+    profiles = profiles or list(DENSITY_PROFILES)
+    return [f"bench-{profiles[i % len(profiles)]}-{i // len(profiles)}" for i in range(count)]
+
+def percentile(values: list, q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+def run_single(addresses: list, radius: int, args, stats: site.RunStats, transport, base_url: str) -> list:
+    """逐个地址调用 AnalysisCore.evaluate_location（GUI 的单地址路径），返回每个地址的耗时"""
+    core = site.AnalysisCore(lambda message: None, rate_limiter=site.RateLimiter(args.qps), max_workers=args.fetch_workers, write_summary=False,
+                             transport=transport, base_url=base_url, stats=stats)
+    latencies = []
+    for address in addresses:
+        started = time.perf_counter()
+        result = core.evaluate_location(address, radius)
+        latencies.append(time.perf_counter() - started)
+        stats.record_address(address, latencies[-1], result is not None)
+    return latencies
+
+def run_batch(addresses: list, radius, args, stats: site.RunStats, transport, base_url: str) -> list:
+    """evaluate_many 批量路径（radius 为列表时走多半径模式），返回每个地址的耗时"""
+    for _ in site.evaluate_many(addresses, radius, workers=args.workers, backup_dir="backup", logger_func=lambda message: None,
+                                rate_limiter=site.RateLimiter(args.qps), fetch_workers=args.fetch_workers, transport=transport,
+                                base_url=base_url, stats=stats, report_dir=None):
+        pass
+    return [entry['wall_s'] for entry in stats.addresses]
+
+SCENARIOS = {"single": run_single, "batch": run_batch, "batch_radii": run_batch}
+
+def run_scenario(name: str, stub: StubProcess, addresses: list, args) -> dict:
+    radius = args.radii if name == "batch_radii" else args.radius
+    stats, transport = site.RunStats(), site.RequestsTransport()
+    stub.get_counters(reset=True)
+    random.seed(args.seed) # 退避抖动也固定下来
+    tracemalloc.start(); tracemalloc.reset_peak()
+    started = time.perf_counter()
+    try: latencies = SCENARIOS[name](addresses, radius, args, stats, transport, stub.base_url)
+    finally:
+        wall = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]; tracemalloc.stop()
+        transport.close()
+    totals, counters = stats.report()['totals'], stub.get_counters()
+    n = len(addresses)
+    return {
+        'scenario': name, 'addresses': n, 'radius': radius, 'wall_s': round(wall, 3),
+        'addresses_per_minute': round(n / wall * 60, 2) if wall else 0,
+        'requests_per_address': round(totals['requests'] / n, 2), 'http_requests_per_address': round((counters['geocode'] + counters['around_search']) / n, 2),
+        'latency_p50_s': round(percentile(latencies, 50), 3), 'latency_p95_s': round(percentile(latencies, 95), 3),
+        'peak_memory_mb': round(peak / 1048576, 2), 'failed_addresses': sum(1 for entry in stats.addresses if not entry['ok']),
+        'retries': totals['retries'], 'injected_errors': counters['http_errors'] + counters['qps_errors'],
+        'throttle_s': round(totals['throttle_s'], 2), 'network_s': round(totals['network_s'], 2),
+    }
+
+COMPARE_FIELDS = [('addresses_per_minute', "地址/分钟", True), ('requests_per_address', "请求/地址", False),
+                  ('latency_p50_s', "p50(秒)", False), ('latency_p95_s', "p95(秒)", False), ('peak_memory_mb', "峰值内存(MB)", False)]
+
+def format_result(result: dict) -> str:
+    return (f"{result['scenario']:<12} {result['addresses']:>4} 个地址  {result['addresses_per_minute']:>8.1f} 地址/分钟  "
+            f"{result['requests_per_address']:>6.1f} 请求/地址 (HTTP {result['http_requests_per_address']:.1f})  "
+            f"p50 {result['latency_p50_s']:.2f}s  p95 {result['latency_p95_s']:.2f}s  峰值内存 {result['peak_memory_mb']:.1f}MB  "
+            f"重试 {result['retries']}  失败 {result['failed_addresses']}")
+
+def compare_lines(results: list, baseline: dict) -> list:
+    """与基线JSON逐场景对比，输出相对变化；带 ↑/↓ 标出变好/变差"""
+    previous = {item['scenario']: item for item in baseline.get('results', [])}
+    lines = []
+    for result in results:
+        before = previous.get(result['scenario'])
+        if not before: lines.append(f"{result['scenario']:<12} 基线中无此场景"); continue
+        parts = []
+        for key, label, higher_is_better in COMPARE_FIELDS:
+            old, new = before.get(key) or 0, result[key]
+            change = (new - old) / old if old else 0.0
+            better = change > 0 if higher_is_better else change < 0
+            parts.append(f"{label} {old:g}→{new:g} ({change:+.1%}{'' if abs(change) < 0.01 else ' ↑' if better else ' ↓'})")
+        lines.append(f"{result['scenario']:<12} " + ", ".join(parts))
+    return lines
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="点位人群画像验证 - 本地桩服务性能基准")
+    parser.add_argument("-n", "--addresses", type=int, default=12, help="每个场景的地址数，按密度档位轮流生成，默认12")
+    parser.add_argument("--profiles", nargs="+", choices=list(DENSITY_PROFILES), help="参与的密度档位，默认全部")
+    parser.add_argument("-s", "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS), help="运行的场景，默认全部")
+    parser.add_argument("-r", "--radius", type=int, default=800, help="单半径场景的搜索半径(米)，默认800")
+    parser.add_argument("--radii", type=int, nargs="+", default=DEFAULT_RADII, help=f"多半径场景的半径列表，默认 {DEFAULT_RADII}")
+    parser.add_argument("-w", "--workers", type=int, default=site.BATCH_WORKERS, help=f"批量场景同时分析的地址数，默认 {site.BATCH_WORKERS}")
+    parser.add_argument("--fetch-workers", type=int, default=site.MAX_FETCH_WORKERS, help=f"每个地址内并发查询的类别数，默认 {site.MAX_FETCH_WORKERS}")
+    parser.add_argument("--qps", type=float, default=site.API_QPS_LIMIT, help=f"令牌桶QPS上限，默认 {site.API_QPS_LIMIT}")
+    parser.add_argument("--latency", type=float, default=0.02, help="桩服务每个请求的固定延迟(秒)，默认0.02")
+    parser.add_argument("--jitter", type=float, default=0.01, help="桩服务附加的随机延迟上限(秒)，默认0.01")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入HTTP 500的比例，默认0")
+    parser.add_argument("--qps-error-rate", type=float, default=0.0, help="注入10021(QPS超限)的比例，默认0")
+    parser.add_argument("--seed", type=int, default=0, help="合成数据与错误注入的随机种子")
+    parser.add_argument("-o", "--output", help="结果写入该JSON文件，可作为之后 --compare 的基线")
+    parser.add_argument("--compare", help="与之前保存的基线JSON对比")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出分析过程的详细日志")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(asctime)s %(message)s", datefmt="%H:%M:%S")
+
+    addresses = make_addresses(args.addresses, args.profiles)
+    config = {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'verbose')}
+    logger.info(f"🧪 基准配置: {json.dumps(config, ensure_ascii=False)}")
+    results, cwd = [], os.getcwd()
+    with StubProcess(latency=args.latency, jitter=args.jitter, http_error_rate=args.error_rate, qps_error_rate=args.qps_error_rate, seed=args.seed) as stub, tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir) # 汇总表、原始数据备份等输出都落在临时目录
+        try:
+            for name in args.scenarios:
+                results.append(run_scenario(name, stub, addresses, args))
+                logger.info(format_result(results[-1]))
+        finally: os.chdir(cwd)
+
+    report = {'created_at': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': sys.version.split()[0], 'config': config, 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f: json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"📈 基准结果已写入: {args.output}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f: baseline = json.load(f)
+        logger.info(f"📊 与基线 {args.compare} ({baseline.get('created_at', '?')}) 对比:")
+        for line in compare_lines(results, baseline): logger.info(line)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,62 @@
 # --- START OF FILE V11.py ---
 
-import tkinter as tk
-from tkinter import scrolledtext, ttk
+import sys
+import argparse
+import logging
+import queue
 import threading
+import random
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import time
 from datetime import datetime
 import numpy as np
 import csv
 import os
+import glob
 import math
+import sqlite3
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field, asdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+tk = ttk = scrolledtext = None # tkinter 仅在启动GUI时导入，命令行/服务器环境无需图形库
+logger = logging.getLogger("site_analyzer")
 
 # --- 【V11 配置】 ---
 API_KEY = "cfed97bf5c90224abbbb2ede4c008d0b" # 请替换为您的高德API Key
-GEOCODE_URL = "https://restapi.amap.com/v3/geocode/geo"
-AROUND_SEARCH_URL = "https://restapi.amap.com/v5/place/around"
+AMAP_BASE_URL = "https://restapi.amap.com" # 可替换为本地桩服务地址用于测试
+GEOCODE_PATH, AROUND_SEARCH_PATH = "/v3/geocode/geo", "/v5/place/around"
+GEOCODE_URL = AMAP_BASE_URL + GEOCODE_PATH
+AROUND_SEARCH_URL = AMAP_BASE_URL + AROUND_SEARCH_PATH
 MAX_RETRY_COUNT = 3
-RETRY_DELAY = 1
+RETRY_DELAY = 1 # 指数退避的初始间隔(秒)，第n次重试等待 RETRY_DELAY*2^n 并加随机抖动
+RETRY_MAX_DELAY = 16
+HTTP_POOL_SIZE = 32
+AMAP_QPS_INFOCODES = {"10004", "10014", "10015", "10016", "10019", "10020", "10021"} # 访问过频/并发超限/服务繁忙：退避后重试
+AMAP_QUOTA_INFOCODES = {"10003", "10044", "10045"} # 日调用量已达上限：重试无意义，终止批次
 API_REQUEST_DELAY = 0.1
 PAGE_SIZE = 25
 MAX_PAGE_NUM = 40
+API_QPS_LIMIT = 20 # 高德Key的每秒请求配额，并发模式下由令牌桶统一限流（替代每次请求前的固定sleep）
+MAX_FETCH_WORKERS = 6 # 并发模式下同时进行的类别查询/翻页数
+BATCH_WORKERS = 4 # 批量评估时同时处理的地址数（所有地址共享同一个令牌桶）
+BACKUP_DIR = "raw_data_backup"
+CACHE_PATH = "amap_cache.sqlite3" # 本地响应缓存，重复分析同一点位时不再消耗API配额
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+CACHE_MAX_ENTRIES = 200000 # 超出后按最近访问时间(LRU)淘汰
+CACHE_GRID_DECIMALS = 5 # 缓存键中坐标保留的小数位（约1米的网格）
+EARTH_RADIUS_M = 6378137
+RESULTS_DB_PATH = "analysis_results.sqlite3" # 结构化结果库（按类型存列，追加写入，供报表查询）
+RESULTS_BATCH_SIZE = 50 # 结果库每累计多少行提交一次
+RUN_REPORT_DIR = "run_reports" # 每次批量运行的性能报告(JSON)
+PROGRESS_INTERVAL = 5 # 命令行模式下进度输出的最小间隔(秒)
+EXIT_QUOTA_EXCEEDED = 3 # 命令行退出码：Key日配额用尽，批次未完成
+GUI_LOG_FLUSH_MS = 100 # GUI日志批量刷新间隔(毫秒)
+BACKUP_FIELDNAMES = ["timestamp", "request_type", "poi_name", "request_params", "response_status", "response_infocode", "response_count", "raw_json_response"]
 
 # --- POI模型配置 V10 (与上一版相同) ---
 MODEL_POI_CONFIG = {
@@ -48,9 +84,58 @@ MODEL_POI_CONFIG = {
     }
 }
 
+# 评级阈值：总分 >= 阈值即得该评级（自上而下匹配），均不满足时为 D；周边有中小学则一票否决为 F
+GRADE_LEVELS = [
+    (180, "S+ 顶级商圈", "现象级位置，客流和消费力顶尖，是市场标杆，建议不计成本拿下。"),
+    (120, "A  核心区域", "客群精准，配套完善，是理想选择，成功率极高。"),
+    (70, "B  潜力区域", "具备核心优势（如大学城或大型社区），可通过运营弥补短板。"),
+    (40, "C  谨慎考虑", "客流或配套有明显短板，需深入调研特定客群，风险与机遇并存。"),
+]
+GRADE_FALLBACK = ("D  风险较高", "缺乏核心客流支撑，商业环境不成熟，不建议选择。")
+VETO_CATEGORY = "政策风险"
+
+# --- 向量化评分内核 (批量点位 × 批量权重配置，用于权重校准与假设分析) ---
+def effective_counts(counts, saturations):
+    """饱和衰减后的有效计数 s·(1-e^(-n/s))；饱和度为 0 表示不衰减。标量与数组通用，支持广播"""
+    counts, saturations = np.asarray(counts, dtype=float), np.asarray(saturations, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(saturations > 0, saturations * (1 - np.exp(-counts / saturations)), counts)
+
+def build_model_matrices(configs: list = None) -> dict:
+    """把若干份 MODEL_POI_CONFIG 结构的配置转换为矩阵：weights/saturations 形状为 (配置数 × 类别数)，
+    signs(正向+1/负向-1)、groups(所属分组) 按类别排列。类别顺序取第一份配置，其余配置须包含相同类别。"""
+    configs = configs or [MODEL_POI_CONFIG]
+    names = list(configs[0]['positive'].keys()) + list(configs[0]['negative'].keys())
+    weights, saturations = np.zeros((len(configs), len(names))), np.zeros((len(configs), len(names)))
+    for k, config in enumerate(configs):
+        for j, name in enumerate(names):
+            is_positive = name in config['positive']
+            poi_config = config['positive'][name] if is_positive else config['negative'][name]
+            weights[k, j] = poi_config['weight']
+            saturations[k, j] = (poi_config.get('saturation') or 0) if is_positive else 0 # 负向项不做饱和衰减
+    signs = np.array([1.0 if name in configs[0]['positive'] else -1.0 for name in names])
+    groups = np.array([(configs[0]['positive'].get(name) or configs[0]['negative'][name])['category'] for name in names])
+    return {'names': names, 'weights': weights, 'saturations': saturations, 'signs': signs, 'groups': groups}
+
+def score_matrix(counts, model: dict, bonus=None) -> dict:
+    """一次性计算 (点位数 × 类别数) 的数量矩阵在每套权重配置下的得分。
+    bonus 为每个点位的环境加分(餐饮评分+消费画像)，形状 (点位数,)。
+    返回 subscores (点位 × 配置 × 类别)、totals (点位 × 配置)、grades (点位 × 配置，评级代码如 "S+")。"""
+    counts = np.atleast_2d(np.asarray(counts, dtype=float))
+    effective = effective_counts(counts[:, None, :], model['saturations'][None, :, :])
+    subscores = effective * model['weights'][None, :, :] * model['signs']
+    # 与 _score_location 的口径一致：基础得分 = 正向分组得分之和 - 负向分组得分之和（负向分组得分本身为负值）
+    totals = np.where(model['signs'] > 0, subscores, -subscores).sum(axis=2)
+    if bonus is not None: totals = totals + np.asarray(bonus, dtype=float)[:, None]
+    grade_codes = [grade.split(" ")[0] for _, grade, _ in GRADE_LEVELS]
+    grades = np.select([totals >= threshold for threshold, _, _ in GRADE_LEVELS], grade_codes, default=GRADE_FALLBACK[0].split(" ")[0])
+    veto = (counts[:, model['groups'] == VETO_CATEGORY] > 0).any(axis=1)
+    grades[veto] = "F"
+    return {'subscores': subscores, 'totals': totals, 'grades': grades}
+
 # ... 数据备份及后端核心请求函数 (与V10完全相同) ...
 def backup_raw_data_to_csv(backup_writer, request_type, params, response_data, poi_name=None):
-    if not response_data: return
+    if not response_data or backup_writer is None: return
     backup_writer.writerow({
         "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         "request_type": request_type,
@@ -62,51 +147,481 @@ def backup_raw_data_to_csv(backup_writer, request_type, params, response_data, p
         "raw_json_response": json.dumps(response_data, ensure_ascii=False)
     })
 
+def make_backup_filename(backup_dir, address, timestamp, index):
+    safe_address = "".join(x for x in address if x.isalnum())
+    return os.path.join(backup_dir, f"backup_{safe_address}_{timestamp}_{index}.csv")
+
+ALL_POI_NAMES = list(MODEL_POI_CONFIG['positive'].keys()) + list(MODEL_POI_CONFIG['negative'].keys())
+SCORE_GROUPS = ["核心客群", "协同业态", "基础设施", "直接竞争", "政策风险", "风险客群"]
+SUMMARY_FIELDNAMES = ['分析时间', '地址', '半径(米)', '总分', '评级', '核心客群分', '协同业态分', '基础设施分', '竞争环境分', '风险项分', '一句话建议', '经度', '纬度', '竞争对手数量', '中小学数量'] + \
+                     [f"{name}_数量" for name in ALL_POI_NAMES]
+
+def summary_filename() -> str:
+    return f"analysis_summary_{datetime.now().strftime('%Y%m%d')}.csv"
+
+def write_summary_row(summary_data) -> str:
+    """向当日汇总表追加一行，返回文件名"""
+    filename = summary_filename()
+    file_exists = os.path.isfile(filename)
+    with open(filename, 'a', newline='', encoding='utf-8-sig') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=SUMMARY_FIELDNAMES, extrasaction='ignore')
+        if not file_exists: writer.writeheader()
+        writer.writerow(summary_data)
+    return filename
+
+def poi_distance(poi) -> float:
+    """POI 相对查询中心的距离(米)，缺失或无效时视为无穷远"""
+    try: return float(poi.get('distance'))
+    except (ValueError, TypeError): return math.inf
+
+class PoiAggregate:
+    """单个类别的紧凑聚合：逐个折叠POI，只保留打分所需的信息——按距离(米)分桶的数量直方图，
+    以及按到达顺序记录的 (距离, 评分)、(距离, 人均消费)。typecode 不匹配 expected_types 的POI只计入原始数量（与 clean_poi_list 口径一致），
+    评分/人均的解析与求均值口径与 analyze_poi_details 一致：任意半径内的均值都按到达顺序对同一批数值 sum()，
+    因此多半径、单半径、离线重算与列表口径的结果逐位一致。完整的原始响应只写入备份文件，不在内存中驻留。"""
+    __slots__ = ('expected_types', 'raw_count', 'count', 'buckets', 'ratings', 'costs')
+
+    def __init__(self, expected_types: str = None):
+        self.expected_types = set(expected_types.split('|')) if expected_types else None
+        self.raw_count = self.count = 0
+        self.buckets = {} # 距离 -> [原始数, 有效数]
+        self.ratings, self.costs = [], [] # [(距离, 数值)]，按到达顺序
+
+    def add(self, poi: dict):
+        distance = poi_distance(poi)
+        bucket = self.buckets.setdefault(distance, [0, 0])
+        self.raw_count += 1; bucket[0] += 1
+        if self.expected_types and self.expected_types.isdisjoint(poi.get('typecode', '').split(';')): return
+        self.count += 1; bucket[1] += 1
+        business = poi.get('business') or {}
+        try:
+            if business.get('rating'): self.ratings.append((distance, float(business['rating'])))
+            if business.get('cost') and float(business['cost']) > 0: self.costs.append((distance, float(business['cost'])))
+        except (ValueError, TypeError): pass
+
+    def add_page(self, pois: list):
+        for poi in pois: self.add(poi)
+
+    def count_within(self, radius: float = None, cleaned: bool = True) -> int:
+        if radius is None: return self.count if cleaned else self.raw_count
+        return sum(values[1 if cleaned else 0] for distance, values in self.buckets.items() if distance <= radius)
+
+    def averages_within(self, radius: float = None) -> dict:
+        radius = math.inf if radius is None else radius
+        ratings = [value for distance, value in self.ratings if distance <= radius]
+        costs = [value for distance, value in self.costs if distance <= radius]
+        return {'avg_rating': sum(ratings) / len(ratings) if ratings else 0, 'avg_cost': sum(costs) / len(costs) if costs else 0}
+
+def poi_query_key(poi_types: str = None, keywords: str = None) -> str:
+    """周边搜索的查询条件（与请求参数一致：有 keywords 时忽略 types）"""
+    return f"keywords={keywords}" if keywords else f"types={poi_types}"
+
+class RateLimiter:
+    """令牌桶限流器：多个线程共享同一份QPS配额，令牌不足时等待"""
+    def __init__(self, rate: float = API_QPS_LIMIT, capacity: int = None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """预约一个令牌并返回需要等待的秒数，本身不阻塞（调用方在重试循环中自行等待并计时）"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate) - 1
+            self._updated = now
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self) -> float:
+        """取一个令牌（阻塞），返回本次等待的秒数"""
+        wait = self.reserve()
+        if wait > 0: time.sleep(wait)
+        return wait
+
+# --- HTTP传输层 (连接复用、指数退避重试、高德配额/QPS错误码处理) ---
+class AmapRequestError(Exception):
+    """重试耗尽仍未拿到有效响应"""
+
+class AmapQuotaExceeded(AmapRequestError):
+    """Key 的日调用量已用尽，继续请求只会失败"""
+
+def backoff_delay(attempt: int) -> float:
+    """第 attempt 次重试前的等待时间：指数增长、封顶，并在 [50%, 100%] 区间随机抖动，避免多线程同时重试"""
+    return min(RETRY_MAX_DELAY, RETRY_DELAY * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+def throttle_delay(rate_limiter: RateLimiter = None) -> float:
+    return rate_limiter.reserve() if rate_limiter else API_REQUEST_DELAY
+
+REQUEST_METRIC_FIELDS = ('retries', 'bytes', 'network_s', 'throttle_s', 'backoff_s', 'parse_s')
+
+def new_request_metrics() -> dict:
+    """单次请求的计量：重试次数、接收字节数，以及网络、限流等待、退避等待、JSON解析各自的耗时(秒)"""
+    return dict.fromkeys(REQUEST_METRIC_FIELDS, 0)
+
+def check_amap_response(data: dict) -> str | None:
+    """检查高德返回的业务状态：配额用尽时抛出 AmapQuotaExceeded；QPS超限等可重试错误返回错误描述；其余返回 None"""
+    if data.get('status') == '1': return None
+    infocode = str(data.get('infocode', ''))
+    if infocode in AMAP_QUOTA_INFOCODES: raise AmapQuotaExceeded(f"{infocode} {data.get('info', '')}")
+    if infocode in AMAP_QPS_INFOCODES: return f"{infocode} {data.get('info', '')}"
+    return None
+
+class RequestsTransport:
+    """同步传输：共享 requests.Session 连接池（keep-alive），网络错误与QPS超限按指数退避+抖动重试"""
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, max_retries: int = MAX_RETRY_COUNT, timeout: float = 10):
+        self.max_retries, self.timeout = max_retries, timeout
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter); self._session.mount("https://", adapter)
+
+    def get_json(self, url: str, params: dict, rate_limiter: RateLimiter = None, metrics: dict = None) -> dict:
+        error, metrics = None, metrics if metrics is not None else new_request_metrics()
+        for attempt in range(self.max_retries):
+            metrics['retries'] = attempt
+            if attempt:
+                delay = backoff_delay(attempt - 1); time.sleep(delay); metrics['backoff_s'] += delay
+            delay = throttle_delay(rate_limiter); time.sleep(delay); metrics['throttle_s'] += delay
+            try:
+                started = time.perf_counter()
+                response = self._session.get(url, params=params, timeout=self.timeout)
+                metrics['network_s'] += time.perf_counter() - started; metrics['bytes'] += len(response.content)
+                response.raise_for_status()
+                started = time.perf_counter()
+                data = response.json()
+                metrics['parse_s'] += time.perf_counter() - started
+            except (requests.exceptions.RequestException, ValueError) as e: error = repr(e); continue
+            error = check_amap_response(data)
+            if not error: return data
+        raise AmapRequestError(f"重试 {self.max_retries} 次后仍失败: {error}")
+
+    def close(self): self._session.close()
+
+class OfflineTransport:
+    """离线传输：不建立任何连接，任何请求都直接失败；供离线重算等承诺不访问网络的路径使用"""
+    def get_json(self, url: str, params: dict, rate_limiter: RateLimiter = None, metrics: dict = None) -> dict:
+        raise AmapRequestError(f"离线模式不访问网络: {url}")
+
+    def close(self): pass
+
+
+# --- 性能统计 ---
+class RunStats:
+    """单次运行的性能统计（线程安全）：逐请求累计网络、限流等待、退避等待、JSON解析耗时与字节数、重试和缓存命中，
+    按请求类型与POI类别汇总，并记录备份写入等阶段耗时及每个地址的总耗时。
+    各项耗时为所有工作线程之和（线程秒），并发时可能大于运行总时长。"""
+    COUNTERS = ('requests', 'cache_hits', 'failures') + REQUEST_METRIC_FIELDS
+
+    def __init__(self):
+        self.started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._started = time.perf_counter()
+        self.by_type = defaultdict(lambda: dict.fromkeys(self.COUNTERS, 0))
+        self.by_category = defaultdict(lambda: dict.fromkeys(self.COUNTERS + ('fetches', 'wall_s'), 0))
+        self.stages = defaultdict(float)
+        self.addresses = []
+        self.extra = {} # 缓存等附加统计
+        self._lock = threading.Lock()
+
+    def record_request(self, request_type: str, poi_name: str, metrics: dict, cache_hit: bool = False, failed: bool = False):
+        with self._lock:
+            for bucket in (self.by_type[request_type], self.by_category[poi_name or request_type]):
+                bucket['requests'] += 1; bucket['cache_hits'] += cache_hit; bucket['failures'] += failed
+                for key in REQUEST_METRIC_FIELDS: bucket[key] += metrics[key]
+
+    def record_category(self, poi_name: str, seconds: float):
+        with self._lock:
+            self.by_category[poi_name]['fetches'] += 1; self.by_category[poi_name]['wall_s'] += seconds
+
+    def record_stage(self, stage: str, seconds: float):
+        with self._lock: self.stages[stage] += seconds
+
+    def record_address(self, address: str, seconds: float, ok: bool):
+        with self._lock: self.addresses.append({'address': address, 'wall_s': round(seconds, 3), 'ok': ok})
+
+    def report(self) -> dict:
+        with self._lock:
+            wall = time.perf_counter() - self._started
+            totals = {key: sum(bucket[key] for bucket in self.by_type.values()) for key in self.COUNTERS}
+            n = len(self.addresses)
+            return {
+                'started_at': self.started_at, 'wall_s': round(wall, 3), 'addresses': n,
+                'addresses_per_minute': round(n / wall * 60, 2) if wall else 0,
+                'requests_per_address': round(totals['requests'] / n, 2) if n else 0,
+                'totals': totals, 'stages': dict(self.stages),
+                'by_request_type': {k: dict(v) for k, v in self.by_type.items()},
+                'by_category': {k: dict(v) for k, v in sorted(self.by_category.items(), key=lambda item: -item[1]['network_s'])},
+                'per_address': list(self.addresses), **self.extra,
+            }
+
+    def write_json(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f: json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def summary_lines(self, top: int = 5) -> list:
+        report = self.report()
+        totals = report['totals']
+        slowest = sorted(report['by_category'].items(), key=lambda item: -item[1]['wall_s'])[:top]
+        busiest = sorted(report['by_category'].items(), key=lambda item: -item[1]['requests'])[:top]
+        return [
+            f"⏱️ {report['addresses']} 个地址, 用时 {report['wall_s']:.1f}秒 ({report['addresses_per_minute']:.1f} 个/分钟); "
+            f"请求 {totals['requests']} 次 (缓存命中 {totals['cache_hits']}, 失败 {totals['failures']}, 重试 {totals['retries']}), "
+            f"平均每地址 {report['requests_per_address']:.1f} 次, 接收 {totals['bytes'] / 1048576:.2f} MB",
+            f"   线程耗时: 网络 {totals['network_s']:.1f}秒, 限流等待 {totals['throttle_s']:.1f}秒, 退避等待 {totals['backoff_s']:.1f}秒, "
+            f"JSON解析 {totals['parse_s']:.2f}秒, 备份写入 {self.stages.get('backup_write', 0):.2f}秒",
+            "   耗时最多的类别: " + ", ".join(f"{name} {v['wall_s']:.1f}秒" for name, v in slowest),
+            "   请求最多的类别: " + ", ".join(f"{name} {v['requests']}次" for name, v in busiest),
+        ]
+
+class ResponseCache:
+    """基于 SQLite 的高德响应缓存：按 (请求类型, 坐标网格, 半径, types/keywords, 页码) 存储成功的原始JSON，
+    支持 TTL 过期、条数上限下的 LRU 淘汰，并统计命中/未命中次数。多线程共享同一实例。"""
+    def __init__(self, path: str = CACHE_PATH, ttl: float = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path, self.ttl, self.max_entries = path, ttl, max_entries
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed)")
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - ttl,))
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(request_type: str, params: dict) -> str:
+        key_params = {k: v for k, v in params.items() if k != 'key'}
+        if 'location' in key_params:
+            lon, lat = map(float, str(key_params['location']).split(','))
+            key_params['location'] = f"{lon:.{CACHE_GRID_DECIMALS}f},{lat:.{CACHE_GRID_DECIMALS}f}"
+        return f"{request_type}|{json.dumps(key_params, sort_keys=True, ensure_ascii=False)}"
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,)); self._size -= 1; row = None
+            if not row:
+                self.misses += 1; self._conn.commit(); return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key)); self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, response_data: dict):
+        now, payload = time.time(), json.dumps(response_data, ensure_ascii=False)
+        with self._lock:
+            updated = self._conn.execute("UPDATE responses SET response = ?, created = ?, accessed = ? WHERE key = ?", (payload, now, now, key)).rowcount
+            if not updated:
+                self._conn.execute("INSERT INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)", (key, payload, now, now)); self._size += 1
+            if self._size > self.max_entries:
+                evicted = self._conn.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)", (self._size - self.max_entries,)).rowcount
+                self._size -= evicted
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0, 'entries': self._size}
+
+    def close(self):
+        with self._lock: self._conn.close()
+
+@dataclass
+class LocationResult:
+    """单个地址在某一半径下的评估结果（结构化，数值均为原始类型）"""
+    address: str
+    radius: int
+    lon: float
+    lat: float
+    total_score: float
+    grade: str # 评级代码，如 "S+"
+    recommendation: str
+    group_scores: dict # 分组 -> 得分（负向分组为负值，与 categorized_scores 口径一致）
+    counts: dict # MODEL_POI_CONFIG 类别 -> 数量
+    competitor_count: int
+    school_count: int
+    avg_rating: float
+    avg_cost: float
+    quality_bonus: float
+    profile_bonus: float
+    truncated_queries: list = field(default_factory=list)
+    analyzed_at: str = field(default_factory=lambda: datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+    def to_summary_row(self) -> dict:
+        """转换为汇总表 CSV 的一行（沿用原有列名与格式）"""
+        row = {'分析时间': self.analyzed_at, '地址': self.address, '半径(米)': self.radius, '经度': f"{self.lon:.6f}", '纬度': f"{self.lat:.6f}",
+               '总分': f"{self.total_score:.2f}", '评级': self.grade, '一句话建议': self.recommendation,
+               '核心客群分': f"{self.group_scores['核心客群']:.2f}", '协同业态分': f"{self.group_scores['协同业态']:.2f}",
+               '基础设施分': f"{self.group_scores['基础设施']:.2f}", '竞争环境分': f"{-self.group_scores['直接竞争']:.2f}",
+               '风险项分': f"{-self.group_scores['政策风险'] - self.group_scores['风险客群']:.2f}",
+               '竞争对手数量': self.competitor_count, '中小学数量': self.school_count}
+        row.update({f"{name}_数量": count for name, count in self.counts.items()})
+        return row
+
+# --- 结果输出 (批量模式下由唯一的写入者按输入顺序调用) ---
+class CsvSummarySink:
+    """当日汇总表：整个批次只打开一次文件，跨天时自动切换到新文件；每行写完即 flush，中途中断也不丢已完成的结果"""
+    def __init__(self):
+        self.filename, self._file, self._writer = None, None, None
+
+    def write(self, result: LocationResult) -> str:
+        if summary_filename() != self.filename:
+            self.close()
+            self.filename = summary_filename()
+            file_exists = os.path.isfile(self.filename)
+            self._file = open(self.filename, 'a', newline='', encoding='utf-8-sig')
+            self._writer = csv.DictWriter(self._file, fieldnames=SUMMARY_FIELDNAMES, extrasaction='ignore')
+            if not file_exists: self._writer.writeheader()
+        self._writer.writerow(result.to_summary_row()); self._file.flush()
+        return self.filename
+
+    def close(self):
+        if self._file: self._file.close(); self._file = None
+
+class SqliteResultSink:
+    """结构化结果库（SQLite，只追加）：分数/坐标/数量均以数值类型存储，每个 MODEL_POI_CONFIG 类别一列，
+    每次运行在 runs 表中登记一条元数据。行先缓存在内存中，累计 batch_size 行后一次性提交。"""
+    FIXED_COLUMNS = [("run_id", "TEXT"), ("analyzed_at", "TEXT"), ("address", "TEXT"), ("radius", "INTEGER"), ("lon", "REAL"), ("lat", "REAL"),
+                     ("total_score", "REAL"), ("grade", "TEXT"), ("recommendation", "TEXT"), ("competitor_count", "INTEGER"), ("school_count", "INTEGER"),
+                     ("avg_rating", "REAL"), ("avg_cost", "REAL"), ("quality_bonus", "REAL"), ("profile_bonus", "REAL"), ("truncated_queries", "TEXT")]
+
+    def __init__(self, path: str = RESULTS_DB_PATH, run_metadata: dict = None, batch_size: int = RESULTS_BATCH_SIZE):
+        self.path, self.batch_size = path, batch_size
+        self.run_id = uuid.uuid4().hex[:12]
+        self.columns = self.FIXED_COLUMNS + [(f"score_{group}", "REAL") for group in SCORE_GROUPS] + [(f"count_{name}", "INTEGER") for name in ALL_POI_NAMES]
+        self._pending, self._written = [], 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, started_at TEXT, finished_at TEXT, row_count INTEGER, metadata TEXT)")
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS site_scores ({', '.join(f'{self._quote(name)} {kind}' for name, kind in self.columns)})")
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(site_scores)")}
+        for name, kind in self.columns: # 模型新增类别时补列，历史行该列为 NULL
+            if name not in existing: self._conn.execute(f"ALTER TABLE site_scores ADD COLUMN {self._quote(name)} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_site_scores_address ON site_scores (address, analyzed_at)")
+        self._conn.execute("INSERT INTO runs (run_id, started_at, row_count, metadata) VALUES (?, ?, 0, ?)",
+                           (self.run_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), json.dumps(run_metadata or {}, ensure_ascii=False)))
+        self._conn.commit()
+        self._insert_sql = f"INSERT INTO site_scores ({', '.join(self._quote(name) for name, _ in self.columns)}) VALUES ({', '.join('?' * len(self.columns))})"
+
+    @staticmethod
+    def _quote(identifier: str) -> str:
+        return '"' + identifier.replace('"', '""') + '"'
+
+    def write(self, result: LocationResult) -> str:
+        self._pending.append((self.run_id, result.analyzed_at, result.address, result.radius, result.lon, result.lat, result.total_score, result.grade,
+                              result.recommendation, result.competitor_count, result.school_count, result.avg_rating, result.avg_cost,
+                              result.quality_bonus, result.profile_bonus, '|'.join(result.truncated_queries))
+                             + tuple(result.group_scores.get(group) for group in SCORE_GROUPS)
+                             + tuple(result.counts.get(name) for name in ALL_POI_NAMES))
+        if len(self._pending) >= self.batch_size: self.flush()
+        return self.path
+
+    def flush(self):
+        if not self._pending: return
+        self._conn.executemany(self._insert_sql, self._pending)
+        self._written += len(self._pending); self._pending = []
+        self._conn.execute("UPDATE runs SET row_count = ? WHERE run_id = ?", (self._written, self.run_id))
+        self._conn.commit()
+
+    def close(self):
+        self.flush()
+        self._conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), self.run_id))
+        self._conn.commit(); self._conn.close()
+
 class AnalysisCore:
-    def __init__(self, logger_func, update_insight_func, backup_writer):
-        self.log = logger_func
-        self.update_insight = update_insight_func
+    def __init__(self, logger_func=None, update_insight_func=None, backup_writer=None, rate_limiter: RateLimiter = None, max_workers: int = 1, write_summary: bool = True,
+                 cache: ResponseCache = None, transport=None, base_url: str = None, stats: RunStats = None):
+        self.log = logger_func or logger.info
+        self.update_insight = update_insight_func or (lambda *args: None)
         self.backup_writer = backup_writer
+        self.write_summary = write_summary # 批量模式下由 evaluate_many 统一写汇总表
+        # 【新】max_workers > 1 时启用并发查询：各类别并行请求，由共享令牌桶控制总QPS
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter or (RateLimiter() if max_workers > 1 else None)
+        self.cache = cache
+        self.stats = stats
+        self.transport = transport or RequestsTransport() # 批量模式下多个地址共享同一个传输层（连接池）
+        self.geocode_url = base_url + GEOCODE_PATH if base_url else GEOCODE_URL
+        self.around_search_url = base_url + AROUND_SEARCH_PATH if base_url else AROUND_SEARCH_URL
+        self.truncated_queries = [] # 翻页中途失败的查询 (poi_name, 页码, 原因)，结果数量可能偏低
+        self._backup_lock = threading.Lock()
+        self._category_pool = None
+
+    def _backup(self, request_type, params, response_data, poi_name=None):
+        with self._backup_lock: # csv.writer 非线程安全
+            backup_raw_data_to_csv(self.backup_writer, request_type, params, response_data, poi_name=poi_name)
+
+    def _request_json(self, url: str, params: dict, request_type: str, poi_name: str = None) -> dict:
+        """发起一次高德请求并备份原始响应；命中本地缓存时不访问网络（仍写备份，保证备份文件完整）"""
+        metrics, data, failed = new_request_metrics(), None, True
+        try:
+            cache_key = self.cache.make_key(request_type, params) if self.cache else None
+            data = self.cache.get(cache_key) if cache_key else None
+            cache_hit = data is not None
+            if data is None:
+                data = self.transport.get_json(url, params, self.rate_limiter, metrics)
+                if cache_key and data.get('status') == '1': self.cache.put(cache_key, data)
+            failed = False
+        finally:
+            if self.stats: self.stats.record_request(request_type, poi_name, metrics, cache_hit=data is not None and cache_hit, failed=failed)
+        started = time.perf_counter()
+        self._backup(request_type, params, data, poi_name=poi_name)
+        if self.stats: self.stats.record_stage('backup_write', time.perf_counter() - started)
+        return data
 
     def get_coordinates(self, address: str) -> tuple | None:
         self.log(f"📌 正在查询地址: '{address}' ...")
         params = {'key': API_KEY, 'address': address}
-        for _ in range(MAX_RETRY_COUNT):
-            try:
-                time.sleep(API_REQUEST_DELAY)
-                response = requests.get(GEOCODE_URL, params=params, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                backup_raw_data_to_csv(self.backup_writer, "geocode", params, data)
-                if data.get('status') == '1' and int(data.get('count', 0)) > 0:
-                    lon, lat = map(float, data['geocodes'][0]['location'].split(','))
-                    self.log(f"✅ 查询成功: {lon:.6f}, {lat:.6f}\n")
-                    return lon, lat
-            except requests.exceptions.RequestException: time.sleep(RETRY_DELAY)
+        try:
+            data = self._request_json(self.geocode_url, params, "geocode") # 网络错误与QPS超限已由传输层退避重试
+            if data.get('status') == '1' and int(data.get('count', 0)) > 0:
+                lon, lat = map(float, data['geocodes'][0]['location'].split(','))
+                self.log(f"✅ 查询成功: {lon:.6f}, {lat:.6f}\n")
+                return lon, lat
+        except AmapQuotaExceeded: raise
+        except AmapRequestError as e: self.log(f"    -> {e}")
         self.log(f"❌ 地理编码失败: {address}"); return None
 
+    def _fetch_poi_page(self, location_coords: tuple, radius: int, poi_types: str, keywords: str, poi_name: str, page_num: int) -> tuple:
+        """请求周边搜索的单页结果，返回 (本页POI列表, 响应中的count, 失败原因)；成功时失败原因为 None"""
+        params = {'key': API_KEY, 'location': f"{location_coords[0]},{location_coords[1]}", 'radius': radius, 'page_size': PAGE_SIZE, 'page_num': page_num, 'show_fields': 'business'}
+        if keywords: params['keywords'] = keywords
+        else: params['types'] = poi_types
+        try: data = self._request_json(self.around_search_url, params, "around_search", poi_name=poi_name)
+        except AmapQuotaExceeded: raise
+        except AmapRequestError as e: return [], 0, str(e)
+        if data.get('status') != '1': return [], 0, f"{data.get('infocode', 'N/A')} {data.get('info', '')}"
+        try: count = int(data.get('count', 0))
+        except (ValueError, TypeError): count = 0
+        return data.get('pois', []), count, None
+
+    def iter_nearby_poi_pages(self, location_coords: tuple, radius: int, poi_types: str = None, keywords: str = None, poi_name: str = "Unknown"):
+        """逐页产出周边搜索结果。v5 接口的 count 只是本页条数，无法预知总页数，因此类别内逐页翻取；并发只发生在类别之间"""
+        if not (keywords or poi_types): return
+        for page_num in range(1, MAX_PAGE_NUM + 1):
+            pois_on_page, _, error = self._fetch_poi_page(location_coords, radius, poi_types, keywords, poi_name, page_num)
+            if error:
+                # 不再静默丢弃：记录被截断的查询，结果数量可能偏低
+                self.truncated_queries.append((poi_name, page_num, error))
+                self.log(f"    -> ⚠️ {poi_name} 第{page_num}页请求失败({error})，该类别结果被截断。")
+                return
+            if not pois_on_page: return
+            yield pois_on_page
+            if len(pois_on_page) < PAGE_SIZE: return
+
     def search_nearby_poi_details_full(self, location_coords: tuple, radius: int, poi_types: str = None, keywords: str = None, poi_name: str = "Unknown") -> list:
-        all_pois, page_num = [], 1
-        while page_num <= MAX_PAGE_NUM:
-            params = {'key': API_KEY, 'location': f"{location_coords[0]},{location_coords[1]}", 'radius': radius, 'page_size': PAGE_SIZE, 'page_num': page_num, 'show_fields': 'business'}
-            if keywords: params['keywords'] = keywords
-            elif poi_types: params['types'] = poi_types
-            else: break
-            try:
-                time.sleep(API_REQUEST_DELAY)
-                response = requests.get(AROUND_SEARCH_URL, params=params, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                backup_raw_data_to_csv(self.backup_writer, "around_search", params, data, poi_name=poi_name)
-                if data.get('status') == '1':
-                    pois_on_page = data.get('pois', [])
-                    if not pois_on_page: break
-                    all_pois.extend(pois_on_page)
-                    if len(pois_on_page) < PAGE_SIZE: break
-                    page_num += 1
-                else: break
-            except (requests.exceptions.RequestException, json.JSONDecodeError): break
-        return all_pois
+        return [poi for page in self.iter_nearby_poi_pages(location_coords, radius, poi_types, keywords, poi_name) for poi in page]
+
+    def aggregate_nearby_pois(self, location_coords: tuple, radius: int, poi_types: str = None, keywords: str = None, poi_name: str = "Unknown",
+                              expected_types: str = None) -> PoiAggregate:
+        """流式查询：每页POI折叠进紧凑聚合后即丢弃，完整响应只进入备份。"""
+        started = time.perf_counter()
+        try: return self._aggregate_nearby_pois(location_coords, radius, poi_types, keywords, poi_name, expected_types)
+        finally:
+            if self.stats: self.stats.record_category(poi_name, time.perf_counter() - started)
+
+    def _aggregate_nearby_pois(self, location_coords: tuple, radius: int, poi_types: str, keywords: str, poi_name: str, expected_types: str) -> PoiAggregate:
+        aggregate = PoiAggregate(expected_types)
+        for page in self.iter_nearby_poi_pages(location_coords, radius, poi_types, keywords, poi_name): aggregate.add_page(page)
+        return aggregate
 
     def clean_poi_list(self, poi_list: list, expected_types: str) -> list:
         if not expected_types: return poi_list
@@ -148,58 +663,101 @@ class AnalysisCore:
 
     # ... append_to_summary_csv 和 get_rating_and_suggestion 与V10相同 ...
     def append_to_summary_csv(self, summary_data):
-        timestamp = datetime.now().strftime("%Y%m%d")
-        filename = f"analysis_summary_{timestamp}.csv"
-        file_exists = os.path.isfile(filename)
-        all_poi_names = list(MODEL_POI_CONFIG['positive'].keys()) + list(MODEL_POI_CONFIG['negative'].keys())
-        fieldnames = ['分析时间', '地址', '半径(米)', '总分', '评级', '核心客群分', '协同业态分', '基础设施分', '竞争环境分', '风险项分', '一句话建议', '经度', '纬度', '竞争对手数量', '中小学数量'] + \
-                     [f"{name}_数量" for name in all_poi_names]
-        with open(filename, 'a', newline='', encoding='utf-8-sig') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
-            if not file_exists: writer.writeheader()
-            writer.writerow(summary_data)
+        filename = write_summary_row(summary_data)
         self.log(f"✅ 分析结果已追加到汇总表: {filename}")
 
     def get_rating_and_suggestion(self, total_score, categorized_scores):
-        policy_risk_count = categorized_scores.get("政策风险", {}).get("count", 0)
+        policy_risk_count = categorized_scores.get(VETO_CATEGORY, {}).get("count", 0)
         if policy_risk_count > 0:
             return "F  高危", f"【一票否决】周边{policy_risk_count}家中小学，存在严重政策风险，绝对不建议！"
-        if total_score >= 180: return "S+ 顶级商圈", "现象级位置，客流和消费力顶尖，是市场标杆，建议不计成本拿下。"
-        if 120 <= total_score < 180: return "A  核心区域", "客群精准，配套完善，是理想选择，成功率极高。"
-        if 70 <= total_score < 120: return "B  潜力区域", "具备核心优势（如大学城或大型社区），可通过运营弥补短板。"
-        if 40 <= total_score < 70: return "C  谨慎考虑", "客流或配套有明显短板，需深入调研特定客群，风险与机遇并存。"
-        return "D  风险较高", "缺乏核心客流支撑，商业环境不成熟，不建议选择。"
-
-    def evaluate_location(self, address: str, radius: int):
-        self.log("="*60); self.log(f"🚀 开始新任务: {address} (半径: {radius}米)")
+        for threshold, grade, suggestion in GRADE_LEVELS:
+            if total_score >= threshold: return grade, suggestion
+        return GRADE_FALLBACK
+
+    @contextmanager
+    def _fetch_pools(self):
+        if self.max_workers <= 1: yield; return
+        with ThreadPoolExecutor(max_workers=self.max_workers) as category_pool:
+            self._category_pool = category_pool
+            try: yield
+            finally: self._category_pool = None
+
+    def evaluate_location(self, address: str, radius: int) -> LocationResult | None:
+        with self._fetch_pools():
+            results = self._evaluate_location(address, [radius])
+        return results[0] if results else None
+
+    def evaluate_location_radii(self, address: str, radii: list) -> list | None:
+        """多半径模式：只按最大半径查询一轮，较小半径的类别数量、得分和评级均由POI自带的distance字段在本地筛选得出。
+        返回与 radii 顺序一致的 LocationResult 列表。高德周边搜索默认按距离排序，即便结果触及翻页上限，保留的也是最近的POI。"""
+        with self._fetch_pools():
+            return self._evaluate_location(address, list(radii))
+
+    def _prefetch(self, coords: tuple, radius: int, fetch_jobs: list) -> dict:
+        """并发模式下一次性提交所有类别的查询，返回 {poi_name: Future}；串行模式返回空字典"""
+        if not self._category_pool: return {}
+        return {name: self._category_pool.submit(self.aggregate_nearby_pois, coords, radius, poi_types, keywords, poi_name=name, expected_types=expected_types)
+                for name, poi_types, keywords, expected_types in fetch_jobs}
+
+    def _evaluate_location(self, address: str, radii: list) -> list | None:
+        fetch_radius = max(radii)
+        self.log("="*60); self.log(f"🚀 开始新任务: {address} (半径: {'/'.join(map(str, radii))}米)")
         coords = self.get_coordinates(address)
-        if not coords: self.log("❌ 任务终止。"); return
-        
+        if not coords: self.log("❌ 任务终止。"); return None
+
+        all_poi_configs = list(MODEL_POI_CONFIG['positive'].items()) + list(MODEL_POI_CONFIG['negative'].items())
+        # (名称, types, keywords, 清洗用的 expected_types)；餐饮服务只用于画像分析，不做 typecode 清洗
+        fetch_jobs = [(name, config.get('types'), config.get('keywords'), config.get('types')) for name, config in all_poi_configs] + [("餐饮服务", "050000", None, None)]
+        # 查询条件完全相同的类别（如 电影院/网吧 均为 080601）只请求一次，共用同一份聚合
+        canonical, first_by_query = {}, {}
+        for name, poi_types, keywords, expected_types in fetch_jobs:
+            canonical[name] = first_by_query.setdefault((poi_query_key(poi_types, keywords), expected_types), name)
+        prefetched = self._prefetch(coords, fetch_radius, [job for job in fetch_jobs if canonical[job[0]] == job[0]])
+        fetched, jobs_by_name = {}, {job[0]: job for job in fetch_jobs}
+
+        def get_pois(name, progress=None):
+            """每个类别只按最大半径查询一次（流式折叠为 PoiAggregate），后续半径复用同一份聚合"""
+            if canonical[name] != name:
+                if name not in fetched and progress: self.log(f"{progress} (与 {canonical[name]} 查询条件相同，复用结果)")
+                fetched[name] = get_pois(canonical[name])
+            if name not in fetched:
+                if progress: self.log(progress)
+                if name in prefetched: fetched[name] = prefetched[name].result()
+                else: fetched[name] = self.aggregate_nearby_pois(coords, fetch_radius, *jobs_by_name[name][1:3], poi_name=name, expected_types=jobs_by_name[name][3])
+                if fetched[name].raw_count >= MAX_PAGE_NUM * PAGE_SIZE:
+                    self.log(f"    -> ⚠️ {name} 结果已达翻页上限 {MAX_PAGE_NUM * PAGE_SIZE} 条，仅保留距离最近的部分。")
+            return fetched[name]
+
+        return [self._score_location(address, coords, radius, fetch_radius, all_poi_configs, get_pois) for radius in radii]
+
+    def _score_location(self, address: str, coords: tuple, radius: int, fetch_radius: int, all_poi_configs: list, get_pois) -> LocationResult:
+        if radius < fetch_radius: self.log(f"📏 半径 {radius}米: 由 {fetch_radius}米 的查询结果按距离本地筛选")
         # ... 定量分析部分与V10完全相同 ...
         categorized_scores = {
             "核心客群": {"score": 0, "count": 0}, "协同业态": {"score": 0, "count": 0},
             "基础设施": {"score": 0, "count": 0}, "直接竞争": {"score": 0, "count": 0},
             "政策风险": {"score": 0, "count": 0}, "风险客群": {"score": 0, "count": 0}
         }
-        summary_data = {'地址': address, '半径(米)': radius, '经度': f"{coords[0]:.6f}", '纬度': f"{coords[1]:.6f}"}
-        all_poi_configs = list(MODEL_POI_CONFIG['positive'].items()) + list(MODEL_POI_CONFIG['negative'].items())
+        counts = {}
         
+        limit = radius if radius < fetch_radius else None # 全半径时不按距离筛选
         for i, (name, config) in enumerate(all_poi_configs):
             is_positive = name in MODEL_POI_CONFIG['positive']
-            self.log(f"  [{i+1}/{len(all_poi_configs)}] 正在查询({config['category']}): {name}...")
-            raw_poi_list = self.search_nearby_poi_details_full(coords, radius, config.get('types'), config.get('keywords'), poi_name=name)
+            aggregate = get_pois(name, progress=f"  [{i+1}/{len(all_poi_configs)}] 正在查询({config['category']}): {name}...")
+            name_limit = limit
             if name == "中小学校":
                 strict_radius = 200
                 self.log(f"    -> 对“中小学校”执行 {strict_radius}米 严格半径筛查...")
-                raw_poi_list = [p for p in raw_poi_list if int(p.get('distance', 999)) <= strict_radius]
-            cleaned_poi_list = self.clean_poi_list(raw_poi_list, config.get('types'))
-            count = len(cleaned_poi_list)
+                name_limit = min(limit or strict_radius, strict_radius)
+            raw_count, count = aggregate.count_within(name_limit, cleaned=False), aggregate.count_within(name_limit)
+            if config.get('types') and raw_count != count:
+                self.log(f"    -> 数据清洗: {raw_count}条 -> {count}条有效数据。")
             category = config['category']
             impact = 0
             if count > 0:
                 if is_positive:
                     saturation = config.get('saturation')
-                    effective_count = saturation * (1 - np.exp(-count / saturation)) if saturation else count
+                    effective_count = float(effective_counts(count, saturation or 0))
                     impact = effective_count * config['weight']
                     self.log(f"    -> 发现 {count} 个, 有效计分 {effective_count:.1f}, 贡献 +{impact:.1f}")
                 else:
@@ -207,7 +765,7 @@ class AnalysisCore:
                     self.log(f"    -> 发现 {count} 个, 影响 -{impact:.1f}")
             categorized_scores[category]['score'] += impact if is_positive else -impact
             categorized_scores[category]['count'] += count
-            summary_data[f"{name}_数量"] = count
+            counts[name] = count
 
         quantitative_score = (categorized_scores['核心客群']['score'] + categorized_scores['协同业态']['score'] + categorized_scores['基础设施']['score'])
         negative_score = (categorized_scores['直接竞争']['score'] + categorized_scores['政策风险']['score'] + categorized_scores['风险客群']['score'])
@@ -216,9 +774,7 @@ class AnalysisCore:
         # 【改】质化分析数据源更精准
         self.log("\n[+] 正在进行周边【餐饮消费】画像分析...")
         # 只查询“餐饮服务”大类(050000)，确保数据纯净
-        qualitative_pois = self.search_nearby_poi_details_full(coords, radius, poi_types="050000", poi_name="餐饮服务")
-        
-        qualitative_results = self.analyze_poi_details(qualitative_pois)
+        qualitative_results = get_pois("餐饮服务").averages_within(limit)
         avg_rating, avg_cost = qualitative_results['avg_rating'], qualitative_results['avg_cost']
         quality_bonus = self.get_rating_bonus(avg_rating)
         profile_bonus = self.get_cost_bonus(avg_cost) # 使用新的评分模型
@@ -242,17 +798,250 @@ class AnalysisCore:
         grade, recommendation = self.get_rating_and_suggestion(total_score, categorized_scores)
         self.log(f"  评级: {grade}")
         self.log(f"  建议: {recommendation}")
+        if self.truncated_queries:
+            self.log(f"  ⚠️ 以下查询翻页中断，对应数量可能偏低: {', '.join(f'{name}(第{page}页)' for name, page, _ in self.truncated_queries)}")
         self.log("="*60 + "\n")
 
-        summary_data.update({
-            '分析时间': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            '总分': f"{total_score:.2f}", '评级': grade.split(" ")[0], '一句话建议': recommendation,
-            '核心客群分': f"{categorized_scores['核心客群']['score']:.2f}", '协同业态分': f"{categorized_scores['协同业态']['score']:.2f}",
-            '基础设施分': f"{categorized_scores['基础设施']['score']:.2f}", '竞争环境分': f"{-categorized_scores['直接竞争']['score']:.2f}",
-            '风险项分': f"{-categorized_scores['政策风险']['score'] - categorized_scores['风险客群']['score']:.2f}",
-            '竞争对手数量': categorized_scores['直接竞争']['count'], '中小学数量': categorized_scores['政策风险']['count']
-        })
-        self.append_to_summary_csv(summary_data)
+        result = LocationResult(
+            address=address, radius=radius, lon=coords[0], lat=coords[1], total_score=float(total_score), grade=grade.split(" ")[0], recommendation=recommendation,
+            group_scores={group: float(values['score']) for group, values in categorized_scores.items()}, counts=counts,
+            competitor_count=categorized_scores['直接竞争']['count'], school_count=categorized_scores['政策风险']['count'],
+            avg_rating=avg_rating, avg_cost=avg_cost, quality_bonus=quality_bonus, profile_bonus=profile_bonus,
+            truncated_queries=[name for name, _, _ in self.truncated_queries])
+        if self.write_summary: self.append_to_summary_csv(result.to_summary_row())
+        return result
+
+
+# --- 批量评估引擎 ---
+def evaluate_many(addresses, radius: int | list, workers: int = BATCH_WORKERS, backup_dir: str = BACKUP_DIR, logger_func=None, update_insight_func=None,
+                  rate_limiter: RateLimiter = None, fetch_workers: int = 1, timestamp: str = None, cache: ResponseCache = None,
+                  transport=None, base_url: str = None, result_sink: SqliteResultSink = None, stats: RunStats = None, report_dir: str = RUN_REPORT_DIR):
+    """并行评估多个地址，按完成顺序逐个产出 (序号, 地址, LocationResult)；地理编码失败的地址结果为 None。
+    radius 传入列表时走多半径模式（每个地址只按最大半径查询一轮），产出的结果为按半径排列的列表。
+    所有地址共享同一个令牌桶（全局请求预算）；每个地址独立写自己的原始数据备份文件；
+    汇总表（以及可选的结构化结果库 result_sink）只在调用方线程中按输入顺序追加，行不会交错，输出顺序确定。
+    Key 日配额用尽(AmapQuotaExceeded)时取消剩余地址并向调用方抛出。
+    性能统计累计到 stats（未传入时新建），结束时（包括配额用尽或调用方提前停止迭代）输出摘要，
+    并在 report_dir 下写出 JSON 报告（report_dir 为 None 时不写）。"""
+    addresses = list(addresses)
+    logger_func = logger_func or logger.info
+    rate_limiter = rate_limiter or RateLimiter(API_QPS_LIMIT)
+    stats = stats or RunStats()
+    own_transport = transport is None
+    transport = transport or RequestsTransport() # 所有地址共享一个连接池
+    timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+    os.makedirs(backup_dir, exist_ok=True)
+
+    def _run(i, address):
+        log = logger_func if workers <= 1 else (lambda message: logger_func(f"[{i+1}/{len(addresses)}] {message}"))
+        backup_filename = make_backup_filename(backup_dir, address, timestamp, i + 1)
+        log(f"📝 原始数据将备份至: {backup_filename}")
+        with open(backup_filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=BACKUP_FIELDNAMES)
+            writer.writeheader()
+            core = AnalysisCore(log, update_insight_func, writer, rate_limiter=rate_limiter, max_workers=fetch_workers, write_summary=False, cache=cache,
+                                transport=transport, base_url=base_url, stats=stats)
+            started, result = time.perf_counter(), None
+            try:
+                if isinstance(radius, (list, tuple)): result = core.evaluate_location_radii(address, radius)
+                else: result = core.evaluate_location(address, radius)
+                return result
+            except AmapQuotaExceeded: raise
+            except Exception as e: log(f"❌ 分析异常: {address} ({e!r})"); return None
+            finally: stats.record_address(address, time.perf_counter() - started, result is not None)
+
+    pending, next_index = {}, 0
+    summary_sink = CsvSummarySink()
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        futures = {pool.submit(_run, i, address): i for i, address in enumerate(addresses)}
+        for future in as_completed(futures):
+            i = futures[future]
+            pending[i] = result = future.result()
+            # 只把“前面都已完成”的连续结果写入汇总表，保证汇总表顺序与输入一致
+            while next_index in pending:
+                results = pending.pop(next_index) or []
+                for row in (results if isinstance(results, list) else [results]):
+                    logger_func(f"✅ 分析结果已追加到汇总表: {summary_sink.write(row)}")
+                    if result_sink: result_sink.write(row)
+                next_index += 1
+            yield i, addresses[i], result
+    except AmapQuotaExceeded as e:
+        logger_func(f"⛔ 高德Key日配额已用尽({e})，已取消剩余地址。"); raise
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        summary_sink.close()
+        if result_sink: result_sink.flush()
+        if own_transport: transport.close()
+        # 配额用尽、调用方提前停止迭代时同样输出统计与报告，这些正是最需要解释请求量的运行
+        if cache:
+            cache_stats = stats.extra['cache'] = cache.stats()
+            logger_func(f"💾 缓存命中 {cache_stats['hits']} 次, 未命中 {cache_stats['misses']} 次 (命中率 {cache_stats['hit_rate']:.0%}, 共 {cache_stats['entries']} 条)")
+        for line in stats.summary_lines(): logger_func(line)
+        if report_dir:
+            try: logger_func(f"📈 性能报告: {stats.write_json(os.path.join(report_dir, f'run_report_{timestamp}.json'))}")
+            except OSError as e: logger.warning(f"⚠️ 性能报告写入失败({e})") # 不能掩盖正在传播的配额异常
+
+
+# --- 离线重算 (基于 raw_data_backup 备份文件，不访问网络) ---
+def load_backup_site(backup_path: str, expected_types: dict = None) -> dict:
+    """流式读取一个点位的备份文件：各类别的POI按页码顺序逐个折叠进同一个 PoiAggregate（翻页终止规则与在线查询一致），
+    求和顺序与在线查询相同，重算的均值逐位一致；乱序到达的页先暂存，轮到它时再折叠。expected_types 为 {poi_name: 清洗用 types}。"""
+    expected_types = expected_types or {}
+    site = {'address': None, 'coords': None, 'radius': None, 'pois': {}}
+    pending, next_page = {}, {} # poi_name -> {页码: POI列表}（只暂存尚未轮到的页；类别结束后为 None） / 下一个待折叠的页码
+    with open(backup_path, newline='', encoding='utf-8-sig') as csvfile:
+        for row in csv.DictReader(csvfile):
+            try: params, data = json.loads(row['request_params']), json.loads(row['raw_json_response'])
+            except (ValueError, TypeError, KeyError): continue
+            if data.get('status') != '1': continue
+            if row['request_type'] == 'geocode' and not site['coords'] and data.get('geocodes'):
+                site['address'] = params.get('address')
+                site['coords'] = tuple(map(float, data['geocodes'][0]['location'].split(',')))
+            elif row['request_type'] == 'around_search':
+                site['radius'] = max(site['radius'] or 0, int(params['radius']))
+                if not site['coords']: site['coords'] = tuple(map(float, params['location'].split(',')))
+                name = row['poi_name']
+                if name not in site['pois']: site['pois'][name], pending[name], next_page[name] = PoiAggregate(expected_types.get(name)), {}, 1
+                pages, page_num = pending[name], int(params['page_num'])
+                if pages is None or page_num < next_page[name]: continue # 该类别已结束，或重复的页
+                pages[page_num] = data.get('pois', [])
+                while next_page[name] in pages:
+                    pois = pages.pop(next_page[name])
+                    site['pois'][name].add_page(pois); next_page[name] += 1
+                    if len(pois) < PAGE_SIZE: pending[name] = None; break # 空页或不满一页：与在线翻页相同，之后的页不再计入
+    return site
+
+def replay_backups(backup_paths=BACKUP_DIR, radii: list = None, logger_func=None, write_summary: bool = False):
+    """离线重算：逐个读取备份文件，用当前的 MODEL_POI_CONFIG 与评分阈值重新打分，不发起任何网络请求。
+    backup_paths 可以是目录或文件列表；radii 为空时使用备份中的查询半径，否则只重算不大于该半径的部分（超出的半径以警告跳过）。
+    逐个产出 (备份文件, LocationResult 列表)；一次只在内存中保留一个点位的数据。"""
+    if isinstance(backup_paths, str): backup_paths = sorted(glob.glob(os.path.join(backup_paths, "backup_*.csv")))
+    logger_func = logger_func or logger.debug
+    core = AnalysisCore(logger_func, write_summary=write_summary, transport=OfflineTransport())
+    all_poi_configs = list(MODEL_POI_CONFIG['positive'].items()) + list(MODEL_POI_CONFIG['negative'].items())
+    expected_types = {name: config.get('types') for name, config in all_poi_configs}
+    for backup_path in backup_paths:
+        site = load_backup_site(backup_path, expected_types)
+        if not (site['coords'] and site['radius']):
+            logger_func(f"⚠️ 跳过无有效数据的备份: {backup_path}"); continue
+        address = site['address'] or os.path.basename(backup_path)
+        for name, config in all_poi_configs: # 查询条件相同的类别只请求过一次，从同条件的类别取数据
+            query_key = poi_query_key(config.get('types'), config.get('keywords'))
+            twin = next((other for other, other_config in all_poi_configs if other in site['pois'] and other_config.get('types') == config.get('types')
+                         and poi_query_key(other_config.get('types'), other_config.get('keywords')) == query_key), None)
+            if name not in site['pois'] and twin: site['pois'][name] = site['pois'][twin]
+        missing = [name for name, _ in all_poi_configs if name not in site['pois']]
+        if missing: logger_func(f"⚠️ {address}: 备份中缺少类别 {', '.join(missing)}，按 0 个计算")
+        get_pois = lambda name, progress=None: site['pois'].get(name) or PoiAggregate()
+        target_radii = [r for r in (radii or [site['radius']]) if r <= site['radius']]
+        skipped = [r for r in (radii or []) if r > site['radius']]
+        if skipped: # 始终以警告级别输出，避免某个点位在命令行中无声无息地没有结果
+            logger.warning(f"⚠️ {address}: 半径 {', '.join(f'{r}米' for r in skipped)} 超过备份 {backup_path} 的查询半径 {site['radius']}米，已跳过")
+        yield backup_path, [core._score_location(address, site['coords'], radius, site['radius'], all_poi_configs, get_pois) for radius in target_radii]
+
+
+# --- 命令行入口 (无需 tkinter，适用于服务器与定时批量任务) ---
+class ProgressReporter:
+    """节流的进度输出：两次输出至少间隔 interval 秒，最后一个地址完成时必定输出"""
+    def __init__(self, total: int, interval: float = PROGRESS_INTERVAL, logger_func=None):
+        self.total, self.interval, self.done = total, interval, 0
+        self.log = logger_func or logger.info
+        self._started = self._last = time.monotonic()
+
+    def update(self, address: str):
+        self.done += 1
+        now = time.monotonic()
+        if now - self._last < self.interval and self.done < self.total: return
+        self._last = now
+        elapsed = now - self._started
+        self.log(f"进度 {self.done}/{self.total} ({self.done / self.total:.0%})，已用时 {elapsed:.0f}秒，"
+                 f"速度 {self.done / elapsed * 60 if elapsed else 0:.1f} 个地址/分钟，最近完成: {address}")
+
+def read_addresses(source: str) -> list:
+    """从文件读取地址（一行一个）；source 为 '-' 时读取标准输入"""
+    lines = sys.stdin if source == '-' else open(source, encoding='utf-8-sig')
+    try: return [line.strip() for line in lines if line.strip()]
+    finally:
+        if lines is not sys.stdin: lines.close()
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="网吧选址分析器 —— 命令行批量模式（不带参数运行时启动图形界面）")
+    parser.add_argument("addresses", nargs="?", default="-", help="地址文件，一行一个；省略或为 - 时从标准输入读取")
+    parser.add_argument("-r", "--radius", type=int, nargs="+", help="搜索半径(米)，默认800；可给多个（只按最大半径查询一轮）；离线模式下默认沿用备份中的半径")
+    parser.add_argument("-w", "--workers", type=int, default=BATCH_WORKERS, help="同时分析的地址数")
+    parser.add_argument("--fetch-workers", type=int, default=MAX_FETCH_WORKERS, help="单个地址内并发查询数")
+    parser.add_argument("-o", "--output", help="结构化结果输出文件 (JSON Lines)，当日汇总表照常追加")
+    parser.add_argument("--db", default=RESULTS_DB_PATH, help=f"结构化结果库 (SQLite)，默认 {RESULTS_DB_PATH}；传 none 则不写")
+    parser.add_argument("--qps", type=float, default=API_QPS_LIMIT, help="全局每秒请求上限")
+    parser.add_argument("--base-url", help=f"高德接口地址，默认 {AMAP_BASE_URL}（可指向本地桩服务）")
+    parser.add_argument("--no-cache", action="store_true", help="不使用本地响应缓存")
+    parser.add_argument("--replay", metavar="BACKUP_DIR", help="离线模式：用备份文件重新打分，不访问网络（忽略地址输入）")
+    parser.add_argument("--report-dir", default=RUN_REPORT_DIR, help=f"性能报告(JSON)输出目录，默认 {RUN_REPORT_DIR}；传 none 则不写")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出逐条分析日志")
+    parser.add_argument("--gui", action="store_true", help="启动图形界面")
+    args = parser.parse_args(argv)
+    if args.gui: return run_gui()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(asctime)s %(message)s", datefmt="%H:%M:%S")
+    if args.radius and not all(0 < r <= 50000 for r in args.radius): parser.error("半径必须是 1 到 50000 之间的数字。")
+    radii = args.radius or [800]
+    radius = radii[0] if len(radii) == 1 else radii
+    output = open(args.output, 'a', encoding='utf-8') if args.output else None
+    detail_log = logger.info if args.verbose else logger.debug
+
+    def _open_sink(metadata):
+        if args.db.lower() == "none": return None
+        return SqliteResultSink(args.db, run_metadata=dict(metadata, model=MODEL_POI_CONFIG))
+
+    def _emit(results, result_sink=None):
+        for result in (results if isinstance(results, list) else [results]):
+            if output and result: output.write(json.dumps(asdict(result), ensure_ascii=False) + "\n")
+            if result_sink and result and args.replay: result_sink.write(result) # 在线模式由 evaluate_many 按序写入
+
+    try:
+        if args.replay:
+            result_sink = _open_sink({'mode': 'replay', 'backup_dir': args.replay, 'radius': args.radius})
+            try:
+                for backup_path, results in replay_backups(args.replay, radii=args.radius, logger_func=detail_log):
+                    _emit(results, result_sink)
+                    for result in results: logger.info(f"{result.address} ({result.radius}米): {result.total_score:.2f} {result.grade}")
+            finally:
+                if result_sink: result_sink.close()
+            return 0
+        addresses = read_addresses(args.addresses)
+        if not addresses: parser.error("请至少提供一个地址。")
+        progress = ProgressReporter(len(addresses))
+        cache = None if args.no_cache else ResponseCache(CACHE_PATH)
+        transport = RequestsTransport()
+        result_sink = _open_sink({'mode': 'cli', 'radius': radii, 'workers': args.workers, 'fetch_workers': args.fetch_workers, 'qps': args.qps,
+                                  'addresses': len(addresses)})
+        stats, report_dir = RunStats(), None if args.report_dir.lower() == "none" else args.report_dir
+        try:
+            for _, address, results in evaluate_many(addresses, radius, workers=args.workers, logger_func=detail_log, rate_limiter=RateLimiter(args.qps),
+                                                     fetch_workers=args.fetch_workers, cache=cache, transport=transport, base_url=args.base_url,
+                                                     result_sink=result_sink, stats=stats, report_dir=report_dir):
+                _emit(results)
+                progress.update(address)
+        except AmapQuotaExceeded as e:
+            logger.error(f"⛔ 高德Key日配额已用尽({e})，已取消剩余地址；已完成 {progress.done}/{len(addresses)} 个。")
+            return EXIT_QUOTA_EXCEEDED
+        finally:
+            if not args.verbose: # 详细模式下 evaluate_many 已输出摘要
+                for line in stats.summary_lines(): logger.info(line)
+            transport.close()
+            if cache: cache.close()
+            if result_sink: result_sink.close()
+    finally:
+        if output: output.close()
+    return 0
+
+def run_gui():
+    global tk, ttk, scrolledtext
+    import tkinter as tk
+    from tkinter import scrolledtext, ttk
+    root = tk.Tk()
+    app = App(root)
+    root.mainloop()
 
 
 # --- GUI界面 (与V10完全相同, 仅修改标题) ---
@@ -277,12 +1066,20 @@ class App:
         qualitative_frame = ttk.LabelFrame(main_frame, text="餐饮消费画像洞察", padding="10"); qualitative_frame.pack(fill=tk.X, pady=(5,0))
         self.qualitative_label = ttk.Label(qualitative_frame, text="等待分析...", font=("", 10))
         self.qualitative_label.pack(anchor='w')
+        self._log_queue = queue.SimpleQueue()
+        self._flush_log()
 
     def log_to_gui(self, message):
-        def _update():
-            self.log_text.config(state='normal'); self.log_text.insert(tk.END, message + '\n')
+        # 工作线程只入队，由主线程定时批量刷新，避免每行日志一次 root.after
+        self._log_queue.put(message)
+
+    def _flush_log(self):
+        messages = []
+        while not self._log_queue.empty(): messages.append(self._log_queue.get())
+        if messages:
+            self.log_text.config(state='normal'); self.log_text.insert(tk.END, '\n'.join(messages) + '\n')
             self.log_text.config(state='disabled'); self.log_text.see(tk.END)
-        self.root.after(0, _update)
+        self.root.after(GUI_LOG_FLUSH_MS, self._flush_log)
 
     def update_insight_display(self, avg_rating, avg_cost, quality_bonus, profile_bonus):
         def _update():
@@ -298,30 +1095,30 @@ class App:
         if not addresses: self.log_to_gui("错误: 请至少输入一个地址。"); return
         self.start_button.config(state='disabled')
         self.update_insight_display(0, 0, 0, 0); self.qualitative_label.config(text="正在分析...")
-        backup_dir = "raw_data_backup"
-        if not os.path.exists(backup_dir): os.makedirs(backup_dir)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        csv_lock = threading.Lock()
-        threading.Thread(target=self.run_analysis_with_backup, args=(addresses, radius, backup_dir, timestamp, csv_lock), daemon=True).start()
-
-    def run_analysis_with_backup(self, addresses, radius, backup_dir, timestamp, lock):
-        for i, address in enumerate(addresses):
-            safe_address = "".join(x for x in address if x.isalnum())
-            backup_filename = os.path.join(backup_dir, f"backup_{safe_address}_{timestamp}_{i+1}.csv")
-            self.log_to_gui(f"📝 原始数据将备份至: {backup_filename}")
-            with open(backup_filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
-                fieldnames = ["timestamp", "request_type", "poi_name", "request_params", "response_status", "response_infocode", "response_count", "raw_json_response"]
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                with lock:
-                    self.core = AnalysisCore(self.log_to_gui, self.update_insight_display, writer)
-                self.core.evaluate_location(address, radius)
-        self.log_to_gui("🎉🎉🎉 所有任务已完成！ 🎉🎉🎉")
-        self.root.after(0, lambda: self.start_button.config(state='normal'))
+        threading.Thread(target=self.run_analysis_with_backup, args=(addresses, radius), daemon=True).start()
+
+    def run_analysis_with_backup(self, addresses, radius):
+        # GUI 逐个地址分析（日志不交错），单个地址内部并发查询；任何异常都写入日志窗口，并恢复“开始”按钮
+        cache = result_sink = None
+        try:
+            cache = ResponseCache(CACHE_PATH)
+            result_sink = SqliteResultSink(RESULTS_DB_PATH, run_metadata={'mode': 'gui', 'radius': radius, 'addresses': len(addresses), 'model': MODEL_POI_CONFIG})
+            for _ in evaluate_many(addresses, radius, workers=1, logger_func=self.log_to_gui, update_insight_func=self.update_insight_display,
+                                   fetch_workers=MAX_FETCH_WORKERS, cache=cache, result_sink=result_sink):
+                pass
+            self.log_to_gui("🎉🎉🎉 所有任务已完成！ 🎉🎉🎉")
+        except AmapQuotaExceeded: self.log_to_gui("⛔ 任务已中止：高德Key日配额已用尽，剩余地址未分析。") # 详情已由 evaluate_many 输出
+        except Exception as e: self.log_to_gui(f"❌ 任务异常中止: {e!r}")
+        finally:
+            try:
+                if cache: cache.close()
+                if result_sink: result_sink.close()
+            except Exception as e: self.log_to_gui(f"❌ 关闭缓存/结果库失败: {e!r}")
+            self.root.after(0, lambda: self.start_button.config(state='normal'))
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = App(root)
-    root.mainloop()
+    # 直接双击运行（控制台或 pythonw 无标准输入）时保持原有的图形界面；标准输入被重定向（定时任务 < addrs.txt）时走命令行
+    if len(sys.argv) == 1 and (sys.stdin is None or sys.stdin.isatty()): run_gui()
+    else: sys.exit(main())
 
 # --- END OF FILE V11.py ---